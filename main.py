@@ -9,6 +9,7 @@ import sys
 import time
 
 import viewer
+import recorder
 
 import json
 import queue
@@ -60,6 +61,19 @@ def parse_move(board: chess.Board, raw: str) -> chess.Move | None:
 """bio je probllem na Windowsima gdje se window znao zamrznuti ako se ne pumpa event loop"""
 """Python’s built-in input() blocks everything until Enter is pressed."""
 def input_pumped(prompt: str) -> str:
+    if recorder.replaying():
+        line = recorder.next_input()
+        if line is None:
+            print(f"{prompt}\n[replay] End of recording.")
+            shutdown()
+            sys.exit(0)
+        print(prompt + line)
+        return line
+    line = _input_pumped_live(prompt)
+    recorder.log_input(line)
+    return line
+
+def _input_pumped_live(prompt: str) -> str:
     print(prompt, end="", flush=True)
     buf = []
     if os.name == "nt": # Windows path
@@ -175,14 +189,123 @@ def _grammar_words():
     ]
     return squares_spoken + keywords
 
+_small_model = None
+
 def _ensure_vosk_model():
+    # model se učitava samo jednom i ostaje u memoriji
+    global _small_model
+    if _small_model is not None:
+        return _small_model
     try:
-        return Model(MODEL_DIR)
+        _small_model = Model(MODEL_DIR)
+        return _small_model
     except Exception as e:
         print(f"[Vosk] Could not load model at '{MODEL_DIR}'. {e}")
         print("Make sure you downloaded and unzipped a Vosk model and set MODEL_DIR.")
         return None
 
+# KASKADA: mali model dekodira svaki izgovor; samo kad je nesiguran ili potez nije legalan,
+# isti audio se ponovno dekodira velikim modelom (učitava se tek kod prve eskalacije, u worker threadu)
+LARGE_MODEL_DIR = "models/vosk-model-en-us-0.22-lgraph"  # veći model koji podržava grammar (128MB)
+CONF_THRESHOLD = 0.85  # minimalni confidence po riječi za mali model
+
+_large_model = None   # None = još nije učitan, False = nije dostupan
+_large_worker = None
+_cascade_stats = {"utterances": 0, "escalated": 0, "added_s": 0.0, "load_s": 0.0}
+
+def _make_recognizer(model) -> KaldiRecognizer:
+    rec = KaldiRecognizer(model, SAMPLE_RATE, json.dumps(_grammar_words()))
+    rec.SetWords(True)  # confidence po riječi u "result"
+    return rec
+
+def _ensure_large_model():
+    # zove se samo iz worker threada pa nema utrke
+    global _large_model
+    if _large_model is None:
+        t0 = time.perf_counter()
+        try:
+            _large_model = Model(LARGE_MODEL_DIR)
+        except Exception as e:
+            print(f"[Vosk] Could not load large model at '{LARGE_MODEL_DIR}'; cascade disabled. {e}")
+            _large_model = False
+        _cascade_stats["load_s"] += time.perf_counter() - t0
+    return _large_model or None
+
+def _decode_buffer(rec: KaldiRecognizer, pcm: bytes) -> dict:
+    # isti blokovi kao RawInputStream (8000 frameova int16), staje na prvom kraju izgovora kao i uživo
+    block = 8000 * 2
+    for i in range(0, len(pcm), block):
+        if rec.AcceptWaveform(pcm[i:i + block]):
+            return json.loads(rec.Result())
+    return json.loads(rec.FinalResult())
+
+def _decode_large(pcm: bytes) -> dict | None:
+    model = _ensure_large_model()
+    if model is None:
+        return None
+    return _decode_buffer(_make_recognizer(model), pcm)
+
+def _result_text(res: dict | None) -> str | None:
+    if not res:
+        return None
+    text = res.get("text", "").strip()
+    return text if text else None
+
+def _is_confident(res: dict | None, accept) -> bool:
+    text = _result_text(res)
+    if text is None:
+        return False
+    words = res.get("result", [])
+    if words and min(w.get("conf", 1.0) for w in words) < CONF_THRESHOLD:
+        return False
+    return accept is None or accept(text)
+
+def _cascade(res: dict | None, pcm: bytes, accept) -> str | None:
+    """Vraća tekst malog modela, ili velikog ako je mali bio nesiguran a veliki dao prihvatljiv rezultat."""
+    global _large_worker
+    _cascade_stats["utterances"] += 1
+    text = _result_text(res)
+    if not pcm or _large_model is False or _is_confident(res, accept):
+        return text
+
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+    if _large_worker is None:
+        _large_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vosk-large")
+    t0 = time.perf_counter()
+    load_before = _cascade_stats["load_s"]
+    fut = _large_worker.submit(_decode_large, pcm)
+    while True:
+        try:
+            big = fut.result(timeout=0.05)
+            break
+        except FutureTimeout:
+            viewer.pump()  # prozor ostaje responzivan dok veliki model radi
+    if big is None:
+        return text
+    added = time.perf_counter() - t0 - (_cascade_stats["load_s"] - load_before)
+    _cascade_stats["escalated"] += 1
+    _cascade_stats["added_s"] += added
+
+    big_text = _result_text(big)
+    print(f"[Vosk] Small model unsure ({text!r}); large model heard {big_text!r} in +{added * 1000:.0f} ms")
+    if big_text and (accept is None or accept(big_text)):
+        return big_text
+    return text
+
+def cascade_summary():
+    """Ispiše koliki dio izgovora je eskalirao na veliki model i koliko je to koštalo."""
+    s = _cascade_stats
+    if not s["utterances"]:
+        return
+    if _large_model is False:
+        print(f"[Vosk] Cascade disabled (no large model at '{LARGE_MODEL_DIR}'); "
+              f"all {s['utterances']} utterances used the small model only.")
+        return
+    pct = 100.0 * s["escalated"] / s["utterances"]
+    avg_ms = 1000.0 * s["added_s"] / s["escalated"] if s["escalated"] else 0.0
+    print(f"[Vosk] Cascade: {s['escalated']}/{s['utterances']} utterances escalated ({pct:.0f}%), "
+          f"avg +{avg_ms:.0f} ms each, large model load {s['load_s'] * 1000:.0f} ms")
+
 def _words_to_digit(w: str) -> str:
     m = {
         "one":"1","two":"2","three":"3","four":"4","five":"5","six":"6","seven":"7","eight":"8",
@@ -347,17 +470,54 @@ def _normalize_spoken_move(text: str) -> str | None:
     return f"{src}{dst}"
 
 
-def transcribe_once(timeout_sec: float = 6.0) -> str | None:
+def transcribe_once(timeout_sec: float = 6.0, move_no: int | None = None, accept=None) -> str | None:
     """
     Listens once and returns final recognized text, or None on failure/timeouts.
     Uses a constrained grammar for chess vocabulary.
+    If the small model is unsure, or accept(text) is False, the same audio is
+    re-decoded with the large model (see _cascade).
+    When recording, every block fed to the recognizer is saved under move_no;
+    when replaying, the recorded blocks are fed instead of the microphone.
     """
     model = _ensure_vosk_model()
     if model is None:
         return None
 
-    rec = KaldiRecognizer(model, SAMPLE_RATE, json.dumps(_grammar_words()))
+    rec = _make_recognizer(model)
+    if recorder.replaying():
+        return _transcribe_replay(rec, move_no, accept)
+
+    recorder.begin_utterance(move_no)
+    res, pcm = _transcribe_live(rec, timeout_sec)
+    text = _cascade(res, pcm, accept)
+    recorder.end_utterance(text)
+    return text
+
+def _transcribe_replay(rec: KaldiRecognizer, move_no: int | None, accept) -> str | None:
+    # isti blokovi istim redom kao uživo -> isti rezultat, ali bez čekanja na mikrofon
+    item = recorder.next_utterance()
+    if item is None:
+        print("[replay] No more recorded audio.")
+        return None
+    u, pcm = item
+    if u["move"] != move_no:
+        print(f"[replay] Warning: utterance was recorded at move {u['move']}, replaying at move {move_no}.")
+
+    t0 = time.perf_counter()
+    load_before = _cascade_stats["load_s"]
+    text = _cascade(_decode_buffer(rec, pcm), pcm, accept)
+    # jednokratno učitavanje velikog modela ne ulazi u vrijeme dekodiranja
+    ms = (time.perf_counter() - t0 - (_cascade_stats["load_s"] - load_before)) * 1000
+    audio_ms = len(pcm) / (SAMPLE_RATE * 2) * 1000
+    print(f"[replay] move {move_no}: decoded {audio_ms:.0f} ms of audio in {ms:.1f} ms")
+    if text != u.get("text"):
+        print(f"[replay] Mismatch: recorded {u.get('text')!r}, now {text!r}")
+    return text
+
+def _transcribe_live(rec: KaldiRecognizer, timeout_sec: float) -> tuple[dict | None, bytes]:
+    # vraća Vosk rezultat (JSON dict) i sav audio koji je predan prepoznavaču, za eventualni re-decode
     q = queue.Queue()
+    fed = []
 
     def _callback(indata, frames, time_info, status):
         if status:
@@ -380,10 +540,10 @@ def transcribe_once(timeout_sec: float = 6.0) -> str | None:
                     data = q.get(timeout=0.2)
                 except queue.Empty:
                     continue
+                recorder.write_audio(data)
+                fed.append(data)
                 if rec.AcceptWaveform(data):
-                    j = json.loads(rec.Result())
-                    text = j.get("text", "").strip()
-                    return text if text else None
+                    return json.loads(rec.Result()), b"".join(fed)
                 else:
                     # Optional: show partials every ~1s
                     now = _time.time()
@@ -395,12 +555,10 @@ def transcribe_once(timeout_sec: float = 6.0) -> str | None:
                         partial_last_print = now
 
             # timeout, take final best guess if any
-            j = json.loads(rec.FinalResult())
-            text = j.get("text", "").strip()
-            return text if text else None
+            return json.loads(rec.FinalResult()), b"".join(fed)
     except Exception as e:
         print(f"[Vosk] Audio error: {e}")
-        return None
+        return None, b""
 
 def voice_move_once(board: chess.Board) -> chess.Move | str | None:
     """
@@ -410,7 +568,13 @@ def voice_move_once(board: chess.Board) -> chess.Move | str | None:
       - None if nothing usable was heard
     """
     print("🎤 Speak your move (e.g., 'e two to e four', or 'e seven to e eight queen')...")
-    heard = transcribe_once(timeout_sec=7.0)
+
+    def _usable(text: str) -> bool:
+        # kaskada eskalira i kad je prepoznavanje sigurno, ali potez nema smisla u ovoj poziciji
+        norm = _normalize_spoken_move(text)
+        return norm in ("quit", "help") or (norm is not None and parse_move(board, norm) is not None)
+
+    heard = transcribe_once(timeout_sec=7.0, move_no=board.fullmove_number, accept=_usable)
     if not heard:
         print("Didn't catch that.")
         return None
@@ -431,8 +595,28 @@ def voice_move_once(board: chess.Board) -> chess.Move | str | None:
         return None
     return move
 
-def main():
+def shutdown():
+    """Svaki izlaz iz igre (kraj partije, quit, kraj snimke, Ctrl+C) prolazi ovuda."""
+    global _large_worker
+    cascade_summary()
+    if _large_worker is not None:
+        _large_worker.shutdown(wait=False, cancel_futures=True)
+        _large_worker = None
+    viewer.close()
+    recorder.close()
+
+def main(record: bool = False, replay: str | None = None):
     print("Voice Chess)")
+    if replay:
+        seed = recorder.start_replay(replay)
+        print(f"[replay] Replaying session '{replay}' (seed {seed}).")
+    else:
+        seed = random.SystemRandom().randrange(2**32)
+        if record:
+            path = recorder.start_recording(seed)
+            print(f"[recorder] Recording session to '{path}'.")
+    random.seed(seed)  # bot i random strana su ponovljivi uz isti seed
+
     board = chess.Board()
     human_is_white = choose_side()
 
@@ -456,7 +640,7 @@ def main():
             move = input_move(board)
             if move is None:
                 print("You resigned / quit. Bye!")
-                viewer.close()
+                shutdown()
                 sys.exit(0)
             human_san = board.san(move) # ovo je zapis koji se koristi u šahu (npr. Nf3, e4, O-O, exd5) samo za debugging, nepotrebno je
             board.push(move)
@@ -472,12 +656,22 @@ def main():
             viewer.pump(); viewer.render(board)
 
     announce_result(board)
-    viewer.close()
+    shutdown()
 
 
 if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Voice Chess")
+    ap.add_argument("--record", action="store_true",
+                    help="save microphone audio, typed input and RNG seed under --record-dir")
+    ap.add_argument("--record-dir", metavar="DIR", default=recorder.RECORD_DIR,
+                    help="where --record stores sessions (default: %(default)s)")
+    ap.add_argument("--replay", metavar="SESSION_DIR",
+                    help="replay a recorded session instead of using keyboard and microphone")
+    args = ap.parse_args()
+    recorder.configure(record_dir=args.record_dir)
     try:
-        main()
+        main(record=args.record, replay=args.replay)
     except KeyboardInterrupt:
-        viewer.close()
+        shutdown()
         print("\nInterrupted. Goodbye!")
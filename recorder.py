@@ -0,0 +1,176 @@
+import os
+import json
+import mmap
+import struct
+import time
+
+# snima svaki session u poseban folder: audio.wav (sav PCM koji je prepoznavač vidio) + session.json (indeks)
+RECORD_DIR = "recordings"
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # int16
+CHANNELS = 1
+
+_HEADER_SIZE = 44
+_GROW_BYTES = 1 << 20  # mmap raste u koracima od 1MB (~32s zvuka)
+
+# ovo koristi recorder kao flagove
+_rec = None     # _Recording ako snimamo
+_replay = None  # _Replay ako vrtimo snimku
+
+def configure(*, record_dir: str | None = None):
+    """zvati prije start_recording() ako se želi promijeniti folder za snimke"""
+    global RECORD_DIR
+    if record_dir:
+        RECORD_DIR = record_dir
+
+def _wav_header(data_len: int) -> bytes:
+    byte_rate = SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_len, b"WAVE",
+        b"fmt ", 16, 1, CHANNELS, SAMPLE_RATE, byte_rate, SAMPLE_WIDTH * CHANNELS, SAMPLE_WIDTH * 8,
+        b"data", data_len,
+    )
+
+class _WavMap:
+    """WAV datoteka u koju se PCM dopisuje kroz mmap; header se osvježava nakon svakog izgovora."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "w+b")
+        self._f.truncate(_HEADER_SIZE + _GROW_BYTES)
+        self._mm = mmap.mmap(self._f.fileno(), _HEADER_SIZE + _GROW_BYTES)
+        self.size = 0  # broj PCM bajtova
+        self.sync()
+
+    def append(self, data: bytes) -> None:
+        end = _HEADER_SIZE + self.size + len(data)
+        if end > len(self._mm):
+            new_len = max(end, len(self._mm) + _GROW_BYTES)
+            self._mm.close()
+            self._f.truncate(new_len)
+            self._mm = mmap.mmap(self._f.fileno(), new_len)
+        self._mm[end - len(data):end] = data
+        self.size += len(data)
+
+    def sync(self) -> None:
+        self._mm[:_HEADER_SIZE] = _wav_header(self.size)
+        self._mm.flush()
+
+    def close(self) -> None:
+        self.sync()
+        self._mm.close()
+        self._f.truncate(_HEADER_SIZE + self.size)  # makni neiskorišteni rep
+        self._f.close()
+
+class _Recording:
+    def __init__(self, path: str, seed: int):
+        self.path = path
+        self.wav = _WavMap(os.path.join(path, "audio.wav"))
+        self.index = {"sample_rate": SAMPLE_RATE, "seed": seed, "inputs": [], "utterances": []}
+        self.current = None  # izgovor koji se upravo snima
+
+    def save_index(self) -> None:
+        with open(os.path.join(self.path, "session.json"), "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=1)
+
+class _Replay:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "session.json"), encoding="utf-8") as f:
+            self.index = json.load(f)
+        if self.index.get("sample_rate") != SAMPLE_RATE:
+            raise ValueError(f"recording is {self.index.get('sample_rate')} Hz, expected {SAMPLE_RATE} Hz")
+        self._f = open(os.path.join(path, "audio.wav"), "rb")
+        self.audio = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.next_input = 0
+        self.next_utterance = 0
+
+    def close(self) -> None:
+        self.audio.close()
+        self._f.close()
+
+def start_recording(seed: int) -> str:
+    """Otvara novi session u RECORD_DIR i vraća njegov path."""
+    global _rec
+    close()
+    base = os.path.join(RECORD_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    path, n = base, 1
+    while True:
+        # dva sessiona u istoj sekundi ne smiju pregaziti jedan drugome audio.wav
+        try:
+            os.mkdir(path)
+            break
+        except FileExistsError:
+            n += 1
+            path = f"{base}-{n}"
+    _rec = _Recording(path, seed)
+    _rec.save_index()
+    return path
+
+def start_replay(path: str) -> int:
+    """Učitava snimljeni session i vraća RNG seed s kojim je igran."""
+    global _replay
+    close()
+    _replay = _Replay(path)
+    return _replay.index["seed"]
+
+def replaying() -> bool:
+    return _replay is not None
+
+def log_input(line: str) -> None:
+    """Zapamti utipkani red (no-op ako ne snimamo)."""
+    if _rec is None:
+        return
+    _rec.index["inputs"].append(line)
+    _rec.save_index()
+
+def next_input() -> str | None:
+    """Sljedeći utipkani red iz snimke, ili None kad snimka završi."""
+    inputs = _replay.index["inputs"]
+    if _replay.next_input >= len(inputs):
+        return None
+    line = inputs[_replay.next_input]
+    _replay.next_input += 1
+    return line
+
+def begin_utterance(move_no: int | None) -> None:
+    if _rec is None:
+        return
+    _rec.current = {"move": move_no, "offset": _rec.wav.size, "length": 0}
+
+def write_audio(data: bytes) -> None:
+    """Dopiši blok koji je upravo predan prepoznavaču."""
+    if _rec is None or _rec.current is None:
+        return
+    _rec.wav.append(data)
+    _rec.current["length"] += len(data)
+
+def end_utterance(text: str | None) -> None:
+    if _rec is None or _rec.current is None:
+        return
+    _rec.current["text"] = text
+    _rec.index["utterances"].append(_rec.current)
+    _rec.current = None
+    _rec.wav.sync()
+    _rec.save_index()
+
+def next_utterance() -> tuple[dict, bytes] | None:
+    """Sljedeći snimljeni izgovor (zapis iz indeksa, PCM), ili None kad ih nema više."""
+    utterances = _replay.index["utterances"]
+    if _replay.next_utterance >= len(utterances):
+        return None
+    u = utterances[_replay.next_utterance]
+    _replay.next_utterance += 1
+    start = _HEADER_SIZE + u["offset"]
+    return u, _replay.audio[start:start + u["length"]]
+
+def close():
+    """Zatvara snimanje/replay (sigurno zvati više puta)."""
+    global _rec, _replay
+    if _rec is not None:
+        _rec.save_index()
+        _rec.wav.close()
+        _rec = None
+    if _replay is not None:
+        _replay.close()
+        _replay = None